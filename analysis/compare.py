@@ -18,18 +18,30 @@ from __future__ import annotations
 from dataclasses import dataclass
 from pathlib import Path
 import argparse
+import mmap
+import os
 import re
-from typing import Dict, Tuple, Optional, Iterable, List
-
-
-SECTION_RE = re.compile(
-    r"^final(?:\s*\((?P<desc>[^)]*)\))?:\s*live values at end of each block:\s*(?P<func>.+?)\s*$"
+import stat
+import sys
+from typing import Dict, FrozenSet, Tuple, Optional, Iterable, List
+
+
+# One pattern per dump line; the matching alternative (m.lastgroup) tells us
+# what kind of line it is, so every line goes through the regex engine once.
+# The dump grammar is ASCII, so all patterns run on raw bytes and only the
+# captured fields are decoded.
+#   section: "final (desc): live values at end of each block: <FUNC>"
+#   stop:    "Begin processing block ..." (the dump moved on to another phase)
+#   block:   "  b1: v8(459) v9(12)[R0] ... avoid=R0 R1"
+LINE_RE = re.compile(
+    rb"(?P<section>final(?:\s*\((?P<desc>[^)]*)\))?:\s*live values at end of each block:\s*(?P<func>.+?)\s*$)"
+    rb"|(?P<stop>Begin processing block)"
+    rb"|(?P<block>\s*b(?P<bid>\d+):(?P<body>.*))"
 )
-BLOCK_RE = re.compile(r"^\s*b(?P<bid>\d+):\s*(?P<body>.*)$")
-# Match avoid=... at end of line
-AVOID_RE = re.compile(r"\bavoid=(?P<avoid>.+?)\s*$")
-# vNNN(123)[R0,R1]   -- regs optional, inside brackets
-VAR_RE = re.compile(r"^(?P<v>v\d+)\((?P<n>\d+)\)(?:\[(?P<regs>[^\]]+)\])?$")
+# Start of the trailing avoid=... list in a block body
+AVOID_RE = re.compile(rb"\bavoid=")
+# vNNN(123)[R0,R1]   -- regs optional, inside brackets; one whitespace-separated token
+VAR_RE = re.compile(rb"(?<!\S)(?P<v>v\d+)\((?P<n>\d+)\)(?:\[(?P<regs>[^\]\s]+)\])?(?!\S)")
 
 
 def file_label(path: str) -> str:
@@ -48,20 +60,13 @@ def comparison_header(left_path: str, left_desc: Optional[str],
     return f"{section_label(left_path, left_desc)} - {section_label(right_path, right_desc)}"
 
 
-def _split_regs(regs_str: str) -> Tuple[str, ...]:
-    # Accept both comma and/or whitespace separated lists.
-    toks = [t for t in re.split(r"[,\s]+", regs_str.strip()) if t]
-    # Normalize order so comparisons are order-insensitive.
-    return tuple(sorted(toks))
-
-
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class BlockState:
-    vars: Dict[str, Tuple[int, Tuple[str, ...]]]  # vX -> (n, (regs... sorted))
-    avoid: Tuple[str, ...]                        # sorted unique
+    vars: Dict[str, Tuple[int, FrozenSet[str]]]  # vX -> (n, {regs...})
+    avoid: FrozenSet[str]
 
 
-@dataclass
+@dataclass(slots=True)
 class Section:
     desc: Optional[str]
     header_line: str
@@ -77,66 +82,112 @@ def parse_file(path: str) -> Dict[str, Section]:
     cur_func: Optional[str] = None
     cur_desc: Optional[str] = None
     cur_header: Optional[str] = None
-
-    def ensure(func: str, desc: Optional[str], header_line: str) -> Section:
-        if func not in sections:
-            sections[func] = Section(desc=desc, header_line=header_line, blocks={})
+    cur_blocks: Dict[int, BlockState] = {}
+
+    # Dumps repeat the same few names (v12, R0, ...) millions of times: decode
+    # each distinct raw token once and share the interned str / tuple objects
+    # across all blocks and sections.
+    names: Dict[bytes, str] = {}
+    empty: FrozenSet[str] = frozenset()
+    reg_lists: Dict[Optional[bytes], FrozenSet[str]] = {None: empty}
+    avoid_lists: Dict[bytes, FrozenSet[str]] = {}
+
+    # Bound methods of the precompiled patterns, looked up once per file
+    # instead of once per line.
+    match_line, search_avoid, iter_vars = LINE_RE.match, AVOID_RE.search, VAR_RE.finditer
+
+    def intern_names(raw: bytes) -> List[str]:
+        return [sys.intern(t) for t in raw.decode("utf-8", "replace").split()]
+
+    with open(path, "rb") as f:
+        st = os.fstat(f.fileno())
+        if not stat.S_ISREG(st.st_mode):
+            # Pipes and process substitutions can't be mapped (and report
+            # size 0): read the stream and scan the bytes the same way.
+            data = f.read()
+        elif st.st_size == 0:
+            return sections  # mmap refuses empty files
         else:
-            # Keep first header_line; update desc if we didn't have one.
-            if sections[func].desc is None and desc:
-                sections[func].desc = desc
-        return sections[func]
-
-    with open(path, "r", encoding="utf-8", errors="replace") as f:
-        for raw in f:
-            line = raw.rstrip("\n")
-
-            msec = SECTION_RE.match(line)
-            if msec:
-                cur_desc = msec.group("desc")
-                cur_func = msec.group("func").strip()
-                cur_header = line
-                ensure(cur_func, cur_desc, cur_header)
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    try:
+        pos, size = 0, len(data)
+        while pos < size:
+            if cur_func is None:
+                # Outside a section only "final..." headers matter: let find
+                # skip to the next one instead of reading (and regex-matching)
+                # every line in between.
+                if data[pos:pos + 5] != b"final":
+                    pos = data.find(b"\nfinal", pos)
+                    if pos < 0:
+                        break
+                    pos += 1
+
+            eol = data.find(b"\n", pos)
+            if eol < 0:
+                eol = size
+            line = data[pos:eol].rstrip(b"\r")
+            pos = eol + 1
+
+            m = match_line(line)
+            if not m:
+                continue
+            kind = m.lastgroup
+
+            if kind == "section":
+                desc = m.group("desc")
+                cur_desc = desc.decode("utf-8", "replace") if desc is not None else None
+                cur_func = sys.intern(m.group("func").strip().decode("utf-8", "replace"))
+                cur_header = line.decode("utf-8", "replace")
+                sec = sections.get(cur_func)
+                if sec is None:
+                    sec = sections[cur_func] = Section(cur_desc, cur_header, {})
+                elif sec.desc is None and cur_desc:
+                    # Keep first header_line; update desc if we didn't have one.
+                    sec.desc = cur_desc
+                cur_blocks = sec.blocks
                 continue
 
             if cur_func is None:
                 continue
 
             # Optional: stop parsing a section when the dump goes into other phases.
-            if line.startswith("Begin processing block"):
+            if kind == "stop":
                 cur_func = None
                 cur_desc = None
                 cur_header = None
                 continue
 
-            mb = BLOCK_RE.match(line)
-            if not mb:
-                continue
-
-            bid = int(mb.group("bid"))
-            body = mb.group("body").strip()
+            bid = int(m.group("bid"))
+            body = m.group("body")
 
-            # Extract avoid=... (order-insensitive)
-            avoid: Tuple[str, ...] = ()
-            mavoid = AVOID_RE.search(body)
+            # Extract avoid=... (order-insensitive); tokens are whitespace separated
+            avoid = empty
+            mavoid = search_avoid(body)
             if mavoid:
-                avoid_str = mavoid.group("avoid").strip()
-                # avoid tokens are whitespace separated in the dump
-                toks = [t for t in avoid_str.split() if t]
-                avoid = tuple(sorted(set(toks)))
-                body = body[:mavoid.start()].strip()
-
-            vars_map: Dict[str, Tuple[int, Tuple[str, ...]]] = {}
-            for tok in body.split():
-                vm = VAR_RE.match(tok)
-                if not vm:
-                    continue
-                vname = vm.group("v")
-                n = int(vm.group("n"))
-                regs = _split_regs(vm.group("regs") or "")
-                vars_map[vname] = (n, regs)
-
-            sections[cur_func].blocks[bid] = BlockState(vars=vars_map, avoid=avoid)
+                avoid_b = body[mavoid.end():]
+                avoid = avoid_lists.get(avoid_b)
+                if avoid is None:
+                    avoid = avoid_lists[avoid_b] = frozenset(intern_names(avoid_b))
+                body = body[:mavoid.start()]
+
+            vars_map: Dict[str, Tuple[int, FrozenSet[str]]] = {}
+            for vm in iter_vars(body):
+                v_b, n_b, regs_b = vm.groups()
+                vname = names.get(v_b)
+                if vname is None:
+                    vname = names[v_b] = sys.intern(v_b.decode("ascii"))
+                regs = reg_lists.get(regs_b)
+                if regs is None:
+                    # Accept both comma and/or whitespace separated lists; a set
+                    # makes comparisons order-insensitive.
+                    regs = reg_lists[regs_b] = frozenset(intern_names(regs_b.replace(b",", b" ")))
+                vars_map[vname] = (int(n_b), regs)
+
+            cur_blocks[bid] = BlockState(vars_map, avoid)
+    finally:
+        if isinstance(data, mmap.mmap):
+            data.close()
 
     return sections
 
@@ -154,25 +205,25 @@ def compare_sections(pathA: str, A: Dict[str, Section],
     """
     labelA, labelB = file_label(pathA), file_label(pathB)
     diffs_found = False
+    # Collect the whole report and write it once instead of print() per line.
+    out: List[str] = []
 
-    keysA, keysB = set(A.keys()), set(B.keys())
-    onlyA = sorted(keysA - keysB)
-    onlyB = sorted(keysB - keysA)
-    common = sorted(keysA & keysB)
+    # dict key views support set algebra directly; no intermediate sets.
+    onlyA = sorted(A.keys() - B.keys())
+    onlyB = sorted(B.keys() - A.keys())
+    common = sorted(A.keys() & B.keys())
 
     if onlyA:
         diffs_found = True
-        print(f"Sections only in {labelA}:")
-        for n in onlyA:
-            print(f"  - {n}")
-        print()
+        out.append(f"Sections only in {labelA}:")
+        out.extend(f"  - {n}" for n in onlyA)
+        out.append("")
 
     if onlyB:
         diffs_found = True
-        print(f"Sections only in {labelB}:")
-        for n in onlyB:
-            print(f"  - {n}")
-        print()
+        out.append(f"Sections only in {labelB}:")
+        out.extend(f"  - {n}" for n in onlyB)
+        out.append("")
 
     # Only print a function section if there is at least one diff within it.
     for func in common:
@@ -180,10 +231,9 @@ def compare_sections(pathA: str, A: Dict[str, Section],
         hdr = comparison_header(pathA, secA.desc, pathB, secB.desc)
 
         blocksA, blocksB = secA.blocks, secB.blocks
-        bidsA, bidsB = set(blocksA.keys()), set(blocksB.keys())
-        b_onlyA = sorted(bidsA - bidsB)
-        b_onlyB = sorted(bidsB - bidsA)
-        b_common = sorted(bidsA & bidsB)
+        b_onlyA = sorted(blocksA.keys() - blocksB.keys())
+        b_onlyB = sorted(blocksB.keys() - blocksA.keys())
+        b_common = sorted(blocksA.keys() & blocksB.keys())
 
         func_lines: List[str] = []
         func_has_diff = False
@@ -201,12 +251,16 @@ def compare_sections(pathA: str, A: Dict[str, Section],
 
         for bid in b_common:
             a, b = blocksA[bid], blocksB[bid]
+            # Most blocks are identical between two dumps; dict/frozenset
+            # equality settles that in C before any per-variable diffing.
+            if a.avoid == b.avoid and a.vars == b.vars:
+                continue
 
-            vA, vB = set(a.vars.keys()), set(b.vars.keys())
+            vA, vB = a.vars.keys(), b.vars.keys()
             v_onlyA = sorted(vA - vB)
             v_onlyB = sorted(vB - vA)
 
-            v_changed: List[Tuple[str, Tuple[int, Tuple[str, ...]], Tuple[int, Tuple[str, ...]]]] = []
+            v_changed: List[Tuple[str, Tuple[int, FrozenSet[str]], Tuple[int, FrozenSet[str]]]] = []
             for v in sorted(vA & vB):
                 av, bv = a.vars[v], b.vars[v]
                 if av != bv:
@@ -228,7 +282,7 @@ def compare_sections(pathA: str, A: Dict[str, Section],
 
                 for (v, (an, aregs), (bn, bregs)) in v_changed[:max_var_diffs_per_block]:
                     func_lines.append(
-                        f"    {v}: {labelA}=({an},{list(aregs)}) {labelB}=({bn},{list(bregs)})"
+                        f"    {v}: {labelA}=({an},{sorted(aregs)}) {labelB}=({bn},{sorted(bregs)})"
                     )
                 if len(v_changed) > max_var_diffs_per_block:
                     func_lines.append(
@@ -237,18 +291,19 @@ def compare_sections(pathA: str, A: Dict[str, Section],
 
                 if avoid_changed:
                     func_lines.append(
-                        f"    avoid: {labelA}={list(a.avoid)} {labelB}={list(b.avoid)}"
+                        f"    avoid: {labelA}={sorted(a.avoid)} {labelB}={sorted(b.avoid)}"
                     )
 
         if func_has_diff:
             diffs_found = True
-            print(f"=== {func} ({hdr}) ===")
-            for ln in func_lines:
-                print(ln)
-            print()
+            out.append(f"=== {func} ({hdr}) ===")
+            out.extend(func_lines)
+            out.append("")
 
     if not diffs_found:
-        print("No differences found.")
+        out.append("No differences found.")
+
+    sys.stdout.write("\n".join(out) + "\n")
 
     return 1 if diffs_found else 0
 
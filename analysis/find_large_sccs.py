@@ -1,40 +1,133 @@
 #!/usr/bin/env python3
+import mmap
+import os
 import sys
 from pathlib import Path
 from typing import Optional
 
-from scc_csv_parser import iter_scc_rows, parse_scc_sizes
-
-
-def analyze_scc_files(path: Path, pattern: str, limit_rows: Optional[int] = None) -> list[dict]:
-    results: list[dict] = []
-    count = 0
-
-    for file_path, line_num, row in iter_scc_rows(path, pattern):
-        if limit_rows and count >= limit_rows:
-            break
-
-        sizes = parse_scc_sizes(row.structure)
-
-        # Empty structure means all-singleton SCCs
-        if not sizes:
-            max_cluster = 1 if row.blocks > 0 else 0
-            nontriv_count = 0
-        else:
-            max_cluster = max(sizes)
-            nontriv_count = sum(1 for s in sizes if s > 1)
-
-        results.append({
-            "file": file_path.name,
-            "row_number": line_num,
-            "func": row.func,
-            "blocks": row.blocks,
-            "kernels": row.kernels,
-            "max_cluster_size": max_cluster,
-            "nontriv_scc_count": nontriv_count,
-        })
-        count += 1
-
+import numpy as np
+import pandas as pd
+
+from scc_csv_parser import iter_scc_rows_bytes, map_files, parse_scc_sizes
+
+_OPEN, _CLOSE, _B = ord("["), ord("]"), ord("b")
+
+
+def scc_size_stats(buf: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Largest SCC size and number of non-trivial SCCs for each structure.
+
+    buf holds a whole file as bytes, structure i is buf[starts[i]:ends[i]].
+    A component is an innermost '[...]' group inside a structure, its size
+    the number of 'b<digits>' tokens in it. Empty groups are ignored, as in
+    parse_scc_sizes.
+    """
+    n = starts.size
+    max_cluster = np.zeros(n, dtype=np.int64)
+    nontriv = np.zeros(n, dtype=np.int64)
+    if not n:
+        return max_cluster, nontriv
+
+    # Innermost groups: an opening bracket whose next bracket closes it.
+    # Function names may contain brackets too; only groups that lie within
+    # a structure span are kept.
+    br = np.flatnonzero((buf == _OPEN) | (buf == _CLOSE))
+    is_open = buf[br] == _OPEN
+    inner = np.flatnonzero(is_open[:-1] & ~is_open[1:])
+    g_open, g_close = br[inner], br[inner + 1]
+    g_row = np.searchsorted(starts, g_open, side="right") - 1
+    in_struct = g_row >= 0
+    in_struct[in_struct] = g_close[in_struct] < ends[g_row[in_struct]]
+    g_open, g_close, g_row = g_open[in_struct], g_close[in_struct], g_row[in_struct]
+
+    # Block tokens: 'b' followed by a digit, attributed to the group around it.
+    nxt = buf[1:]
+    tok = np.flatnonzero((buf[:-1] == _B) & (nxt >= ord("0")) & (nxt <= ord("9")))
+    g = np.searchsorted(g_open, tok, side="right") - 1
+    inside = g >= 0
+    inside[inside] = tok[inside] < g_close[g[inside]]
+    sizes = np.bincount(g[inside], minlength=g_open.size)
+
+    keep = sizes > 0
+    sizes, g_row = sizes[keep], g_row[keep]
+    if sizes.size:
+        # Groups come in row order, so each row's groups form one contiguous
+        # run; both statistics are reduced over the same run boundaries.
+        first = np.flatnonzero(np.concatenate(([True], g_row[1:] != g_row[:-1])))
+        rows = g_row[first]
+        max_cluster[rows] = np.maximum.reduceat(sizes, first)
+        nontriv[rows] = np.add.reduceat((sizes > 1).astype(np.int64), first)
+    return max_cluster, nontriv
+
+
+def _analyze_file(file_path: Path) -> pd.DataFrame:
+    line_nums: list[int] = []
+    funcs: list[str] = []
+    blocks: list[int] = []
+    kernels: list[int] = []
+    starts: list[int] = []
+    ends: list[int] = []
+    # Rows the byte scan can't take apart go through parse_line instead:
+    # (index into the lists above, structure string).
+    fallback: list[tuple[int, str]] = []
+
+    with open(file_path, "rb") as fh:
+        if os.fstat(fh.fileno()).st_size == 0:
+            return _frame(file_path, line_nums, funcs, blocks, kernels, [], [])  # mmap refuses empty files
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for line_num, span, row in iter_scc_rows_bytes(mm):
+                if span is None:
+                    fallback.append((len(funcs), row.structure))
+                    # Empty span right after the previous structure keeps
+                    # starts sorted without claiming any of its groups.
+                    s = e = ends[-1] if ends else 0
+                else:
+                    s, e = span
+                line_nums.append(line_num)
+                funcs.append(row.func)
+                blocks.append(row.blocks)
+                kernels.append(row.kernels)
+                starts.append(s)
+                ends.append(e)
+
+            buf = np.frombuffer(mm, dtype=np.uint8)
+            max_cluster, nontriv_count = scc_size_stats(
+                buf, np.asarray(starts, dtype=np.int64), np.asarray(ends, dtype=np.int64))
+            del buf  # release the export so the mmap can close
+
+    for i, structure in fallback:
+        sizes = parse_scc_sizes(structure)
+        max_cluster[i] = max(sizes, default=0)
+        nontriv_count[i] = sum(1 for n in sizes if n > 1)
+
+    return _frame(file_path, line_nums, funcs, blocks, kernels, max_cluster, nontriv_count)
+
+
+def _frame(file_path, line_nums, funcs, blocks, kernels, max_cluster, nontriv_count) -> pd.DataFrame:
+    blocks_arr = np.asarray(blocks, dtype=np.int64)
+    max_cluster = np.asarray(max_cluster, dtype=np.int64)
+    # Empty structure means all-singleton SCCs
+    no_groups = max_cluster == 0
+    max_cluster[no_groups] = (blocks_arr[no_groups] > 0).astype(np.int64)
+
+    return pd.DataFrame({
+        "file": file_path.name,
+        "row_number": np.asarray(line_nums, dtype=np.int64),
+        "func": funcs,
+        "blocks": blocks_arr,
+        "kernels": np.asarray(kernels, dtype=np.int64),
+        "max_cluster_size": max_cluster,
+        "nontriv_scc_count": np.asarray(nontriv_count, dtype=np.int64),
+    })
+
+
+def analyze_scc_files(path: Path, pattern: str, limit_rows: Optional[int] = None) -> pd.DataFrame:
+    files = [path] if path.is_file() else sorted(path.glob(pattern))
+    if not files:
+        return pd.DataFrame()
+
+    results = pd.concat(map_files(_analyze_file, files, limit=limit_rows), ignore_index=True)
+    if limit_rows:
+        results = results.head(limit_rows)
     return results
 
 
@@ -64,18 +157,18 @@ def main():
             i += 1
 
     results = analyze_scc_files(target_path, pattern)
-    if not results:
+    if results.empty:
         print(f"No rows found in {target_path}", file=sys.stderr)
         sys.exit(0)
 
-    results.sort(key=lambda d: (d["max_cluster_size"], d["blocks"]), reverse=True)
+    results = results.sort_values(["max_cluster_size", "blocks"], ascending=False, kind="stable")
 
     print(f"Found {len(results)} rows from {target_path}\n")
     header = f"{'file':28} {'row':>6} {'blocks':>8} {'kernels':>8} {'max_scc':>8} {'#nontriv':>8}  func"
     print(header)
     print("-" * len(header))
 
-    for r in results[:top_n]:
+    for r in results.head(top_n).to_dict("records"):
         func = r["func"]
         if len(func) > 80:
             func = func[:77] + "..."
@@ -85,8 +178,7 @@ def main():
         )
 
     if out_csv:
-        import pandas as pd
-        pd.DataFrame(results).to_csv(out_csv, index=False)
+        results.to_csv(out_csv, index=False)
         print(f"\nWrote: {out_csv}")
 
 
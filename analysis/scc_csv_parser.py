@@ -5,19 +5,36 @@ Shared CSV parsing utilities for SCC analysis scripts.
 Handles the tricky CSV format where function names may contain commas:
     func_name, num_blocks, num_kernels, scc_structure
 
-Parses from the right since scc_structure always ends with ']'.
+Parses from the right since scc_structure always ends with ']': the structure
+starts at the last comma that is followed by '[' and preceded by the two
+integer columns. Structures normally contain no commas, but rows where one
+does are still accepted.
 """
+import os
 import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from typing import Iterator, NamedTuple
+from typing import Callable, Iterator, NamedTuple, TypeVar
 
-# Parse from right: ", blocks, kernels, [...]" at end of line
-_LINE_PATTERN = re.compile(r'^(.*),\s*(\d+)\s*,\s*(\d+)\s*,\s*(\[.*\])\s*$')
+import numpy as np
+
+T = TypeVar("T")
 
 # For parsing SCC structure internals
 _BRACKET_GROUP_RE = re.compile(r"\[([^\[\]]*)\]")
 _BLOCK_TOKEN_RE = re.compile(r"b\d+")
 
+# ", blocks, kernels, [...]" at the end of a row whose structure has no commas;
+# the group captures "blocks, kernels" as one piece.
+_COUNTS_RE = re.compile(rb",[ \t]*(\d+[ \t]*,[ \t]*\d+)[ \t]*,[ \t]*\[[^,\n]*\][ \t\r]*$", re.M)
+# The same row shape anchored at the line start; any other line is captured
+# whole (second group) so it can go through parse_line.
+_COUNTS_LINE_RE = re.compile(
+    rb"^(?:[^\n]*,[ \t]*(\d+[ \t]*,[ \t]*\d+)[ \t]*,[ \t]*\[[^,\n]*\][ \t\r]*|([^\n]+))$", re.M
+)
+
 
 class SCCRow(NamedTuple):
     """Parsed row from an SCC CSV file."""
@@ -32,14 +49,27 @@ def parse_line(line: str) -> SCCRow | None:
     
     Returns SCCRow or None if line doesn't match expected format.
     """
-    m = _LINE_PATTERN.match(line.strip())
-    if m:
-        return SCCRow(
-            func=m.group(1).strip(),
-            blocks=int(m.group(2)),
-            kernels=int(m.group(3)),
-            structure=m.group(4),
-        )
+    # Plain string splits from the right instead of a regex: the last comma
+    # followed by '[' starts the structure, the two before it delimit blocks
+    # and kernels. Earlier commas are only tried for malformed structures.
+    # Slice comparisons and positional SCCRow construction keep the common
+    # path free of method calls and keyword handling.
+    line = line.strip()
+    if line[-1:] != ']':
+        return None
+    end = len(line)
+    while (comma := line.rfind(',', 0, end)) >= 0:
+        end = comma
+        structure = line[comma + 1:].lstrip()
+        if structure[:1] != '[':
+            continue
+        try:
+            func, blocks, kernels = line[:comma].rsplit(',', 2)
+        except ValueError:
+            return None
+        blocks, kernels = blocks.strip(), kernels.strip()
+        if blocks.isdecimal() and kernels.isdecimal():
+            return SCCRow(func.strip(), int(blocks), int(kernels), structure)
     return None
 
 
@@ -52,18 +82,59 @@ def iter_scc_rows(path: Path, pattern: str = "*_scc.csv") -> Iterator[tuple[Path
         
     Yields:
         (file_path, 1-indexed line number, SCCRow)
+
+    Each file is read into memory whole rather than streamed line by line,
+    so peak memory grows with the largest file.
     """
     if path.is_file():
         files = [path]
     else:
         files = sorted(path.glob(pattern))
     
+    # Same row scanner as structure_stats and find_large_sccs use.
     for f in files:
-        with open(f, 'r', encoding='utf-8', errors='replace') as fh:
-            for i, line in enumerate(fh, start=1):
-                row = parse_line(line)
-                if row:
-                    yield f, i, row
+        for i, _, row in iter_scc_rows_bytes(f.read_bytes()):
+            yield f, i, row
+
+
+def iter_scc_rows_bytes(data: bytes) -> Iterator[tuple[int, tuple[int, int] | None, SCCRow]]:
+    """Iterate over the rows of one SCC CSV file given as raw bytes (or mmap).
+    
+    Yields:
+        (1-indexed line number, (start, end) byte span of the structure in data, SCCRow)
+        
+    Same rows as parse_line on the decoded lines. Newlines and commas are
+    located with one NumPy pass over the buffer: in a well-formed row the
+    last three commas of the line delimit blocks, kernels and the structure,
+    so only the function name and structure are decoded. Lines that don't fit
+    that shape go through parse_line; their span is None.
+    """
+    buf = np.frombuffer(data, dtype=np.uint8)
+    nl = np.flatnonzero(buf == ord('\n'))
+    line_start = np.concatenate(([0], nl + 1))
+    line_end = np.append(nl, buf.size)
+    commas = np.flatnonzero(buf == ord(','))
+    del buf  # an mmap can't be closed while a view of it is alive
+    if commas.size < 3:
+        return  # no line can hold a row
+
+    last = np.searchsorted(commas, line_end) - 1
+    cand = np.flatnonzero((last >= 2) & (commas[np.maximum(last - 2, 0)] >= line_start))
+    c = last[cand]
+    for line_num, ls, le, c1, c2, c3 in zip(
+        (cand + 1).tolist(), line_start[cand].tolist(), line_end[cand].tolist(),
+        commas[c - 2].tolist(), commas[c - 1].tolist(), commas[c].tolist(),
+    ):
+        tail = data[c3 + 1:le]
+        structure = tail.strip()
+        blocks, kernels = data[c1 + 1:c2].strip(), data[c2 + 1:c3].strip()
+        if structure[:1] == b'[' and structure[-1:] == b']' and blocks.isdigit() and kernels.isdigit():
+            func = data[ls:c1].decode('utf-8', 'replace').strip()
+            row = SCCRow(func, int(blocks), int(kernels), structure.decode('utf-8', 'replace'))
+            start = c3 + 1 + len(tail) - len(tail.lstrip())
+            yield line_num, (start, start + len(structure)), row
+        elif row := parse_line(data[ls:le].decode('utf-8', 'replace')):
+            yield line_num, None, row
 
 
 def parse_scc_components(structure: str) -> list[list[str]]:
@@ -71,21 +142,62 @@ def parse_scc_components(structure: str) -> list[list[str]]:
     
     Example: '[[b1] [b6 b4 b10] [b11]]' -> [['b1'], ['b6', 'b4', 'b10'], ['b11']]
     """
-    groups = _BRACKET_GROUP_RE.findall(structure)
-    comps: list[list[str]] = []
-    for g in groups:
-        toks = _BLOCK_TOKEN_RE.findall(g)
-        if toks:
-            comps.append(toks)
-    return comps
+    return [list(c) for c in _scc_components(structure)]
 
 
-def parse_scc_sizes(structure: str) -> list[int]:
+@lru_cache(maxsize=65536)
+def _scc_components(structure: str) -> tuple[tuple[str, ...], ...]:
+    # The one cache behind both parse_scc_components and parse_scc_sizes:
+    # each distinct structure is scanned once, and SCC shapes repeat heavily
+    # across functions. Callers get fresh lists or sizes built from the cached
+    # tuples. Block names are interned so the cache holds one 'b<id>' str per id.
+    find_tokens = _BLOCK_TOKEN_RE.findall
+    return tuple(
+        tuple(map(sys.intern, toks)) for g in _BRACKET_GROUP_RE.findall(structure) if (toks := find_tokens(g))
+    )
+
+
+def parse_scc_sizes(structure: str) -> tuple[int, ...]:
     """Parse SCC structure string into component sizes.
     
-    Example: '[[b1] [b6 b4 b10] [b11]]' -> [1, 3, 1]
+    Example: '[[b1] [b6 b4 b10] [b11]]' -> (1, 3, 1)
+
+    Takes the lengths of the cached _scc_components tuples, so a repeated
+    structure costs no regex work.
     """
-    return [len(c) for c in parse_scc_components(structure)]
+    return tuple(map(len, _scc_components(structure)))
+
+
+def read_scc_counts(path: Path) -> np.ndarray:
+    """Return the (blocks, kernels) columns of one SCC CSV file as an (n, 2) int32 array.
+    
+    For scripts that only need the counts: one regex pass over the raw file
+    bytes, without building SCCRow objects or decoding function names. The
+    matched "blocks, kernels" pairs are joined into one comma-separated
+    buffer that NumPy converts in a single call.
+
+    The regex only covers rows whose structure has no commas. If any line
+    of the file is left unmatched, the file is scanned again line by line
+    and those lines go through parse_line, so the result has the same rows
+    as iter_scc_rows.
+    """
+    data = path.read_bytes()
+    pairs = _COUNTS_RE.findall(data)
+    if len(pairs) != data.count(b"\n") + (not data.endswith(b"\n")):
+        pairs = []
+        for fast, line in _COUNTS_LINE_RE.findall(data):
+            if fast:
+                pairs.append(fast)
+            elif row := parse_line(line.decode('utf-8', 'replace')):
+                pairs.append(b"%d,%d" % (row.blocks, row.kernels))
+    return np.fromstring(b",".join(pairs), dtype=np.int32, sep=",").reshape(-1, 2)
+
+
+def read_all_counts(files: list[Path]) -> tuple[np.ndarray, np.ndarray]:
+    """Return (blocks, kernels) of every row in `files`, read in parallel."""
+    parts = map_files(read_scc_counts, files)
+    counts = np.concatenate(parts) if parts else np.empty((0, 2), dtype=np.int32)
+    return counts[:, 0], counts[:, 1]
 
 
 def get_scc_files(path: Path, pattern: str = "*_scc.csv") -> list[Path]:
@@ -96,3 +208,30 @@ def get_scc_files(path: Path, pattern: str = "*_scc.csv") -> list[Path]:
     if not files:
         raise SystemExit(f"No files found in {path} matching {pattern}")
     return files
+
+
+def map_files(fn: Callable[[Path], T], files: list[Path], limit: int | None = None) -> list[T]:
+    """Apply fn to every file, in worker processes when more than one core is available.
+    
+    The files are independent, so each worker parses whole files on its own.
+    Results come back in file order. fn must be a module-level function so it
+    can be pickled.
+
+    With a limit (for capped debugging runs), the files are processed one at
+    a time in this process, and no further file is read once the results hold
+    `limit` rows in total (by len()).
+    """
+    if limit:
+        results: list[T] = []
+        rows = 0
+        for f in files:
+            if rows >= limit:
+                break
+            results.append(result := fn(f))
+            rows += len(result)
+        return results
+    workers = min(len(files), os.cpu_count() or 1)
+    if workers <= 1:
+        return [fn(f) for f in files]
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        return list(ex.map(fn, files, chunksize=4))
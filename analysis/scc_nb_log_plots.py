@@ -1,23 +1,27 @@
 #!/usr/bin/env python3
 import argparse
+from functools import lru_cache
 from pathlib import Path
 import math
 
 import numpy as np
-import pandas as pd
+import matplotlib
+matplotlib.use("Agg")  # plots are only written to files
 import matplotlib.pyplot as plt
+from scipy.special import gammaln, xlog1py
+from scipy.stats import nbinom
 
-from scc_csv_parser import iter_scc_rows, get_scc_files
+from scc_csv_parser import get_scc_files, read_all_counts
 
+plt.rcParams.update({"path.simplify_threshold": 1.0, "agg.path.chunksize": 10000})
 
 # ---------------------------
 # Negative Binomial utilities
 # ---------------------------
 
-def nb_mom_fit(x: pd.Series):
-    x = x.dropna().astype(int)
-    mu = float(x.mean()) if len(x) else float("nan")
-    var = float(x.var(ddof=1)) if len(x) > 1 else 0.0
+def nb_mom_fit(x: np.ndarray):
+    mu = float(x.mean()) if x.size else float("nan")
+    var = float(x.var(ddof=1)) if x.size > 1 else 0.0
 
     if not np.isfinite(mu) or mu <= 0 or var <= mu:
         return {"mu": mu, "var": var, "r": float("inf"), "p": 1.0}
@@ -27,55 +31,90 @@ def nb_mom_fit(x: pd.Series):
     return {"mu": mu, "var": var, "r": r, "p": p}
 
 
-def nb_logpmf(k: int, r: float, p: float) -> float:
-    return (
-        math.lgamma(k + r) - math.lgamma(r) - math.lgamma(k + 1)
-        + r * math.log(p) + k * math.log(1 - p)
-    )
+def nb_logpmf(k: np.ndarray, r: float, p: float) -> np.ndarray:
+    # Same expression scipy.stats.nbinom uses, without its per-call
+    # argument checking and broadcasting machinery.
+    return gammaln(k + r) - gammaln(r) - gammaln(k + 1) + r * math.log(p) + xlog1py(k, -p)
 
 
+@lru_cache(maxsize=32)
 def nb_pmf_array(kmax: int, r: float, p: float) -> np.ndarray:
+    """NB pmf over 0..kmax, renormalised to that range.
+
+    Cached per (kmax, r, p), so plots of the same fit share one array; it is
+    returned read-only for that reason.
+    """
     if not np.isfinite(r):
-        return np.zeros(kmax + 1, dtype=float)
+        pmf = np.zeros(kmax + 1, dtype=float)
+    else:
+        pmf = np.exp(nb_logpmf(np.arange(kmax + 1), r, p))
+        s = pmf.sum()
+        if s > 0:
+            pmf /= s
+    pmf.flags.writeable = False
+    return pmf
 
-    pmf = np.empty(kmax + 1, dtype=float)
-    for k in range(kmax + 1):
-        pmf[k] = math.exp(nb_logpmf(k, r, p))
 
-    s = pmf.sum()
-    if s > 0:
-        pmf /= s
-    return pmf
+def ecdf_xy(x: np.ndarray, points: int = 2000):
+    """ECDF steps of the positive counts in x.
 
+    Counts repeat heavily, so the curve is built from the distinct values and
+    their cumulative frequencies rather than one step per observation. When
+    there are more than `points` distinct values, it is evaluated at that
+    many log-spaced integers instead; points=0 keeps every distinct value.
+    """
+    x = x[x > 0]  # log10 of the smallest value below needs it positive
+    vals, counts = np.unique(x, return_counts=True)
+    ys = np.cumsum(counts) / x.size
+    if not points or vals.size <= points:
+        return vals, ys
 
-def ecdf_xy(x: pd.Series):
-    x = x.dropna().astype(int)
-    x = x[x > 0]
-    xs = np.sort(x.to_numpy())
-    n = xs.size
-    ys = np.arange(1, n + 1) / n
-    return xs, ys
+    grid = np.logspace(math.log10(vals[0]), math.log10(vals[-1]), points)
+    x_plot = np.unique(np.clip(np.rint(grid).astype(vals.dtype), vals[0], vals[-1]))
+    return x_plot, ys[np.searchsorted(vals, x_plot, side="right") - 1]
 
 
 # ---------------------------
 # Plotting
 # ---------------------------
 
+@lru_cache(maxsize=8)
+def _prep_bins(max_x: int, nbins: int, nb_min: int) -> tuple[np.ndarray, ...]:
+    """Log-spaced bin edges for hist_logx_with_nb and the per-bin NB ranges.
+
+    Returns (bins, centers, ka, kb, valid): ka..kb are the integers inside
+    each bin, restricted to k >= nb_min, and valid marks the bins where that
+    range is non-empty. They only depend on the arguments, so every plot with
+    the same layout shares one set of read-only arrays.
+    """
+    bins = np.logspace(0, math.log10(max_x), nbins)
+    bins[0] = 1.0
+    bins[-1] = float(max_x)
+
+    lo, hi = bins[:-1], bins[1:]
+    centers = np.sqrt(lo * hi)
+    ka = np.maximum(max(nb_min, 0), np.ceil(lo).astype(np.int64))
+    kb = np.minimum(max_x, np.floor(hi - 1e-12).astype(np.int64))
+    valid = (hi > nb_min) & (ka <= kb)
+
+    arrays = (bins, centers, ka, kb, valid)
+    for a in arrays:
+        a.flags.writeable = False
+    return arrays
+
+
 def hist_logx_with_nb(
-    x: pd.Series, fit: dict, title: str, outpath: Path,
+    x_pos: np.ndarray, fit: dict, title: str, outpath: Path,
     max_x: int = 500, max_y: int = 5000, nbins: int = 45, nb_min: int = 200,
 ):
-    x = x.dropna().astype(int)
-    x_pos = x[x > 0]
-    if x_pos.empty:
+    if not x_pos.size:
         return
 
-    bins = np.logspace(0, math.log10(max_x), nbins)
-    bins[0] = 1.0
-    bins[-1] = float(max_x)
+    bins, bin_centers, ka, kb, valid = _prep_bins(max_x, nbins, nb_min)
 
     plt.figure()
-    plt.hist(x_pos.to_numpy(), bins=bins)
+    counts, _ = np.histogram(x_pos, bins=bins)
+    plt.bar(bins[:-1], counts, width=np.diff(bins), align="edge")
     plt.xscale("log")
     plt.xlim(1, max_x)
     plt.ylim(0, max_y)
@@ -85,33 +124,14 @@ def hist_logx_with_nb(
 
     r, p = fit["r"], fit["p"]
     if np.isfinite(r) and 0 < p < 1:
-        pmf = nb_pmf_array(max_x, r, p)
-        cdf = np.cumsum(pmf)
-        n = len(x_pos)
-
-        exp_counts = []
-        bin_centers = []
+        n = x_pos.size
 
-        for i in range(len(bins) - 1):
-            a, b = bins[i], bins[i + 1]
-            center = math.sqrt(a * b)
-            bin_centers.append(center)
+        # Expected count per bin: n * P[ka <= K <= kb], with the NB truncated
+        # to 0..max_x. Only the bin edges are evaluated, not the whole pmf.
+        prob = (nbinom.cdf(kb, r, p) - nbinom.cdf(ka - 1, r, p)) / nbinom.cdf(max_x, r, p)
+        exp_counts = np.where(valid, n * prob, np.nan)
 
-            if b <= nb_min:
-                exp_counts.append(np.nan)
-                continue
-
-            ka = max(nb_min, 0, int(math.ceil(a)))
-            kb = min(max_x, int(math.floor(b - 1e-12)))
-
-            if ka > kb:
-                exp_counts.append(np.nan)
-                continue
-
-            prob = float(cdf[kb] - (cdf[ka - 1] if ka > 0 else 0.0))
-            exp_counts.append(n * prob)
-
-        plt.plot(bin_centers, exp_counts, marker="o", linestyle="-", label=f"NB fit (k ≥ {nb_min})")
+        plt.plot(bin_centers, exp_counts, color="C1", marker="o", linestyle="-", label=f"NB fit (k ≥ {nb_min})")
         plt.legend()
 
     plt.tight_layout()
@@ -120,7 +140,7 @@ def hist_logx_with_nb(
 
 
 def combined_ecdf_logx_with_nb(
-    blocks: pd.Series, kernels: pd.Series,
+    blocks: np.ndarray, kernels: np.ndarray,
     fit_blocks: dict, fit_kernels: dict,
     outpath: Path, max_x: int = 500,
 ):
@@ -158,18 +178,18 @@ def combined_ecdf_logx_with_nb(
     plt.close()
 
 
-def summary(x: pd.Series) -> dict:
-    x = x.dropna().astype(int)
-    if x.empty:
+def summary(x: np.ndarray) -> dict:
+    if not x.size:
         return {}
     mu = float(x.mean())
-    var = float(x.var(ddof=1)) if len(x) > 1 else 0.0
+    var = float(x.var(ddof=1)) if x.size > 1 else 0.0
     disp = (var / mu) if mu > 0 else float("nan")
+    median, p90 = np.quantile(x, [0.50, 0.90])
     return {
         "n": int(x.size),
         "min": int(x.min()),
-        "median": float(np.percentile(x, 50)),
-        "p90": float(np.percentile(x, 90)),
+        "median": float(median),
+        "p90": float(p90),
         "max": int(x.max()),
         "mean": mu,
         "var": var,
@@ -193,15 +213,9 @@ def main():
 
     files = get_scc_files(indir, args.pattern)
 
-    blocks_list = []
-    kernels_list = []
-
-    for _, _, row in iter_scc_rows(indir, args.pattern):
-        blocks_list.append(row.blocks)
-        kernels_list.append(row.kernels)
-
-    blocks = pd.Series(blocks_list, dtype=int) if blocks_list else pd.Series(dtype=int)
-    kernels = pd.Series(kernels_list, dtype=int) if kernels_list else pd.Series(dtype=int)
+    blocks, kernels = read_all_counts(files)
+    # The histograms and ECDFs only look at positive counts; filter once.
+    blocks_pos, kernels_pos = blocks[blocks > 0], kernels[kernels > 0]
 
     print(f"Files: {len(files)}")
     print("Combined blocks :", summary(blocks))
@@ -214,20 +228,20 @@ def main():
     print("kernels:", fit_k, "  (r=size/shape, p=success prob)")
 
     hist_logx_with_nb(
-        blocks, fit_b,
+        blocks_pos, fit_b,
         title="Histogram (log x) + NB tail overlay: #blocks",
         outpath=outdir / "blocks_hist_logx_nb.png",
         max_x=args.max_x, max_y=args.max_y, nb_min=args.nb_min,
     )
     hist_logx_with_nb(
-        kernels, fit_k,
+        kernels_pos, fit_k,
         title="Histogram (log x) + NB tail overlay: #SCC kernels",
         outpath=outdir / "kernels_hist_logx_nb.png",
         max_x=args.max_x, max_y=args.max_y, nb_min=args.nb_min,
     )
 
     combined_ecdf_logx_with_nb(
-        blocks, kernels, fit_b, fit_k,
+        blocks_pos, kernels_pos, fit_b, fit_k,
         outpath=outdir / "ecdf_logx_blocks_vs_kernels_nb.png",
         max_x=args.max_x,
     )
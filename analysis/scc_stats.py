@@ -3,43 +3,46 @@ import argparse
 from pathlib import Path
 
 import numpy as np
-import pandas as pd
+import matplotlib
+matplotlib.use("Agg")  # plots are only written to files
 import matplotlib.pyplot as plt
 
-from scc_csv_parser import iter_scc_rows, get_scc_files
+from scc_csv_parser import get_scc_files, read_all_counts
 
+plt.rcParams.update({"path.simplify_threshold": 1.0, "agg.path.chunksize": 10000})
 
-def count_summary(x: pd.Series) -> dict:
-    x = x.dropna().astype(int)
-    if x.empty:
+
+def count_summary(arr: np.ndarray) -> dict:
+    if not arr.size:
         return {}
 
-    mean = x.mean()
-    var = x.var(ddof=1) if len(x) > 1 else 0.0
+    mean = arr.mean()
+    var = arr.var(ddof=1) if arr.size > 1 else 0.0
     disp = (var / mean) if mean > 0 else np.nan
+    p10, median, p90 = np.quantile(arr, [0.10, 0.50, 0.90])
 
     return {
-        "n": int(x.size),
-        "min": int(x.min()),
-        "p10": float(np.percentile(x, 10)),
-        "median": float(np.percentile(x, 50)),
-        "p90": float(np.percentile(x, 90)),
-        "max": int(x.max()),
+        "n": int(arr.size),
+        "min": int(arr.min()),
+        "p10": float(p10),
+        "median": float(median),
+        "p90": float(p90),
+        "max": int(arr.max()),
         "mean": float(mean),
         "var": float(var),
         "dispersion(var/mean)": float(disp),
     }
 
 
-def int_hist(x: pd.Series, title: str, xlabel: str, outpath: Path):
-    x = x.dropna().astype(int)
-    if x.empty:
+def int_hist(x: np.ndarray, title: str, xlabel: str, outpath: Path):
+    if not x.size:
         return
 
     bins = np.arange(0, 501 + 1) - 0.5
 
     plt.figure()
-    plt.hist(x.to_numpy(), bins=bins)
+    counts, _ = np.histogram(x, bins=bins)
+    plt.bar(bins[:-1], counts, width=np.diff(bins), align="edge")
     plt.title(title)
     plt.xlabel(xlabel)
     plt.ylabel("Frequency")
@@ -50,24 +53,22 @@ def int_hist(x: pd.Series, title: str, xlabel: str, outpath: Path):
     plt.close()
 
 
-def ecdf_plot_two(a: pd.Series, b: pd.Series, title: str, xlabel: str, outpath: Path,
+def ecdf_plot_two(a: np.ndarray, b: np.ndarray, title: str, xlabel: str, outpath: Path,
                   label_a: str = "blocks", label_b: str = "kernels"):
-    a = a.dropna().astype(int)
-    b = b.dropna().astype(int)
-    if a.empty and b.empty:
+    if not a.size and not b.size:
         return
 
     plt.figure()
 
-    if not a.empty:
-        xs = np.sort(a.to_numpy())
-        ys = np.arange(1, xs.size + 1) / xs.size
-        plt.step(xs, ys, where="post", label=label_a)
+    # One step per distinct count (with its cumulative frequency) rather than
+    # one per observation.
+    if a.size:
+        xs, counts = np.unique(a, return_counts=True)
+        plt.step(xs, np.cumsum(counts) / a.size, where="post", label=label_a)
 
-    if not b.empty:
-        xs = np.sort(b.to_numpy())
-        ys = np.arange(1, xs.size + 1) / xs.size
-        plt.step(xs, ys, where="post", label=label_b)
+    if b.size:
+        xs, counts = np.unique(b, return_counts=True)
+        plt.step(xs, np.cumsum(counts) / b.size, where="post", label=label_b)
 
     plt.title(title)
     plt.xlabel(xlabel)
@@ -93,15 +94,9 @@ def main():
 
     files = get_scc_files(indir, args.pattern)
 
-    blocks_list = []
-    kernels_list = []
-
-    for _, _, row in iter_scc_rows(indir, args.pattern):
-        blocks_list.append(row.blocks)
-        kernels_list.append(row.kernels)
-
-    blocks = pd.Series(blocks_list, dtype=int) if blocks_list else pd.Series(dtype=int)
-    kernels = pd.Series(kernels_list, dtype=int) if kernels_list else pd.Series(dtype=int)
+    # Plain int32 arrays straight from the parser: the counts can't be
+    # missing, so there is nothing to drop or convert.
+    blocks, kernels = read_all_counts(files)
 
     print(f"Files: {len(files)}")
     print("Combined blocks  :", count_summary(blocks))
@@ -1,14 +1,18 @@
 #!/usr/bin/env python3
 import argparse
 import math
-from collections import Counter
+from array import array
 from pathlib import Path
 
 import numpy as np
 import pandas as pd
+import matplotlib
+matplotlib.use("Agg")  # plots are only written to files
 import matplotlib.pyplot as plt
 
-from scc_csv_parser import iter_scc_rows, get_scc_files, parse_scc_components
+from scc_csv_parser import iter_scc_rows_bytes, get_scc_files, map_files, parse_scc_sizes
+
+plt.rcParams.update({"path.simplify_threshold": 1.0, "agg.path.chunksize": 10000})
 
 
 def hist_int(series: pd.Series, outpath: Path, title: str, xlabel: str, logx: bool = False):
@@ -22,13 +26,15 @@ def hist_int(series: pd.Series, outpath: Path, title: str, xlabel: str, logx: bo
         xmin = max(1, int(x.min()))
         xmax = int(x.max())
         bins = np.logspace(math.log10(xmin), math.log10(xmax), 50)
-        plt.hist(x.to_numpy(), bins=bins)
+        counts, _ = np.histogram(x.to_numpy(), bins=bins)
+        plt.bar(bins[:-1], counts, width=np.diff(bins), align="edge")
         plt.xscale("log")
         plt.xlabel(f"{xlabel} (log scale)")
     else:
         mn, mx = int(x.min()), int(x.max())
         bins = np.arange(mn, mx + 2) - 0.5
-        plt.hist(x.to_numpy(), bins=bins)
+        counts, _ = np.histogram(x.to_numpy(), bins=bins)
+        plt.bar(bins[:-1], counts, width=np.diff(bins), align="edge")
         plt.xlabel(xlabel)
 
     plt.title(title)
@@ -38,6 +44,140 @@ def hist_int(series: pd.Series, outpath: Path, title: str, xlabel: str, logx: bo
     plt.close()
 
 
+def size_stats(flat: np.ndarray, starts: np.ndarray) -> dict[str, np.ndarray]:
+    """Per-CFG statistics of SCC sizes stored back to back (CSR layout).
+
+    flat holds the sizes of all CFGs in one array, CFG i's sizes start at
+    starts[i] and run up to the next start; every CFG has at least one size.
+    Each statistic is one ufunc.reduceat over the flat array instead of a
+    Python loop per CFG. one_size and the size counts are NaN when the CFG
+    has no cycle, one_size also unless there is exactly one non-trivial SCC.
+    """
+    num_scc = np.diff(np.append(starts, flat.size))
+    total_nodes = np.add.reduceat(flat, starts)
+    nontriv = flat > 1
+    num_nontriv = np.add.reduceat(nontriv.astype(np.int64), starts)
+    nontriv_nodes = np.add.reduceat(np.where(nontriv, flat, 0), starts)
+    loopy = num_nontriv > 0
+
+    def count(mask: np.ndarray) -> np.ndarray:
+        return np.where(loopy, np.add.reduceat(mask.astype(np.int64), starts), np.nan)
+
+    return {
+        "total_nodes": total_nodes,
+        "num_scc": num_scc,
+        "num_nontriv": num_nontriv,
+        "largest": np.maximum.reduceat(flat, starts),
+        "nontriv_nodes": nontriv_nodes,
+        "frac_nontriv": nontriv_nodes / total_nodes,
+        "merge_mass": total_nodes - num_scc,
+        # sum((sz / total)^2) with the squares summed exactly as integers
+        "hhi": np.add.reduceat(flat * flat, starts) / (total_nodes * total_nodes),
+        # With exactly one non-trivial SCC its size is all of nontriv_nodes.
+        "one_size": np.where(num_nontriv == 1, nontriv_nodes, np.nan),
+        "num_singleton": count(flat == 1),
+        "num_size2": count(flat == 2),
+        "num_size3": count(flat == 3),
+    }
+
+
+def _int_unless_nan(x: np.ndarray) -> np.ndarray:
+    # Same dtype pandas infers for a column of ints mixed with NaN (or not)
+    return x if np.isnan(x).any() else x.astype(np.int64)
+
+
+def _analyze_file(file_path: Path) -> pd.DataFrame:
+    # Only the parsed header fields and the SCC sizes are collected per row;
+    # sizes of all cyclic rows go into one flat array so the statistics can
+    # be computed for the whole file at once.
+    func_col: list[str] = []
+    line_col = array("q")
+    blocks_hdr = array("q")
+    kernels_hdr = array("q")
+    acyclic_col = array("b")
+    flat_sizes = array("q")
+    starts = array("q")
+
+    # The whole file is read as bytes and split by iter_scc_rows_bytes; only
+    # the func and structure fields are decoded.
+    for line_num, _, row in iter_scc_rows_bytes(file_path.read_bytes()):
+        scc_str = row.structure
+
+        # Acyclic CFGs: structure is [] and kernels == blocks
+        if scc_str.replace(" ", "") in ("", "[]"):
+            acyclic_col.append(True)
+        else:
+            sizes = parse_scc_sizes(scc_str)
+            if not sizes:
+                continue
+            acyclic_col.append(False)
+            starts.append(len(flat_sizes))
+            flat_sizes.extend(sizes)
+
+        line_col.append(line_num)
+        func_col.append(row.func)
+        blocks_hdr.append(row.blocks)
+        kernels_hdr.append(row.kernels)
+
+    blocks_hdr_arr = np.frombuffer(blocks_hdr, dtype=np.int64)
+    kernels_hdr_arr = np.frombuffer(kernels_hdr, dtype=np.int64)
+    acyclic = np.frombuffer(acyclic_col, dtype=np.int8).astype(bool)
+    cyclic = ~acyclic
+    stats = size_stats(np.frombuffer(flat_sizes, dtype=np.int64), np.frombuffer(starts, dtype=np.int64))
+
+    # An acyclic CFG is all singletons: one SCC per block.
+    acyc_blocks = blocks_hdr_arr[acyclic]
+    with np.errstate(divide="ignore"):
+        acyc_hhi = np.where(acyc_blocks > 0, 1.0 / acyc_blocks, np.nan)
+    acyclic_stats = {
+        "total_nodes": acyc_blocks,
+        "num_scc": acyc_blocks,
+        "num_nontriv": 0,
+        "largest": (acyc_blocks > 0).astype(np.int64),
+        "nontriv_nodes": 0,
+        "frac_nontriv": 0.0,
+        "merge_mass": 0,
+        "hhi": acyc_hhi,
+        "one_size": np.nan,
+        "num_singleton": np.nan,
+        "num_size2": np.nan,
+        "num_size3": np.nan,
+    }
+
+    cols = {}
+    for name, values in stats.items():
+        col = np.empty(acyclic.size, dtype=values.dtype)
+        col[cyclic] = values
+        col[acyclic] = acyclic_stats[name]
+        cols[name] = col
+
+    num_nontriv = cols["num_nontriv"]
+    all_singletons_arr = num_nontriv == 0
+    return pd.DataFrame({
+        "file": file_path.name,
+        "row_number": np.frombuffer(line_col, dtype=np.int64),
+        "func": func_col,
+        "blocks_hdr": blocks_hdr_arr,
+        "kernels_hdr": kernels_hdr_arr,
+        "blocks_parsed": cols["total_nodes"],
+        "scc_count_parsed": cols["num_scc"],
+        "nontriv_scc_count": num_nontriv,
+        "largest_scc": cols["largest"],
+        "nontriv_nodes": cols["nontriv_nodes"],
+        "frac_nodes_in_nontriv_scc": cols["frac_nontriv"],
+        "is_all_singletons": all_singletons_arr,
+        "is_loopy": ~all_singletons_arr,
+        "is_one_nontriv": num_nontriv == 1,
+        "one_nontriv_size": _int_unless_nan(cols["one_size"]),
+        "num_singleton_scc": _int_unless_nan(cols["num_singleton"]),
+        "num_size2_scc": _int_unless_nan(cols["num_size2"]),
+        "num_size3_scc": _int_unless_nan(cols["num_size3"]),
+        "merge_mass_parsed": cols["merge_mass"],
+        "merge_mass_header": blocks_hdr_arr - kernels_hdr_arr,
+        "hhi_sizes": cols["hhi"],
+    })
+
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("directory", help="Directory containing *_scc.csv files")
@@ -52,91 +192,12 @@ def main():
 
     files = get_scc_files(indir, args.pattern)
 
-    rows = []
-    n_rows = 0
-    ctr_nontrivial_count = Counter()
-    ctr_one_nontrivial_size = Counter()
-
-    for file_path, line_num, row in iter_scc_rows(indir, args.pattern):
-        if args.max_rows and n_rows >= args.max_rows:
-            break
-
-        scc_str = row.structure
-        stripped = scc_str.replace(" ", "")
-
-        # Acyclic CFGs: structure is [] and kernels == blocks
-        if stripped in ("", "[]"):
-            total_nodes = row.blocks
-            num_scc = row.blocks
-            nontriv_sizes = []
-            num_nontriv = 0
-            largest = 1 if row.blocks > 0 else 0
-            nontriv_nodes = 0
-            frac_nontriv = 0.0
-            merge_mass = 0
-            hhi = (1.0 / row.blocks) if row.blocks > 0 else np.nan
-        else:
-            comps = parse_scc_components(scc_str)
-            if not comps:
-                continue
-            sizes_list = [len(c) for c in comps]
-            total_nodes = sum(sizes_list)
-            num_scc = len(sizes_list)
-            nontriv_sizes = [sz for sz in sizes_list if sz > 1]
-            num_nontriv = len(nontriv_sizes)
-            largest = max(sizes_list)
-            nontriv_nodes = sum(nontriv_sizes)
-            frac_nontriv = nontriv_nodes / total_nodes if total_nodes > 0 else 0.0
-            merge_mass = sum(sz - 1 for sz in sizes_list)
-            hhi = sum((sz / total_nodes) ** 2 for sz in sizes_list) if total_nodes > 0 else np.nan
-
-        is_all_singletons = (num_nontriv == 0)
-        is_one_nontriv = (num_nontriv == 1)
-        one_size = nontriv_sizes[0] if is_one_nontriv else np.nan
-        is_loopy = not is_all_singletons  # has at least one cycle
-
-        # For loopy CFGs, count SCCs by size (sizes_list already computed in else block)
-        if is_loopy:
-            num_singleton = sum(1 for sz in sizes_list if sz == 1)
-            num_size2 = sum(1 for sz in sizes_list if sz == 2)
-            num_size3 = sum(1 for sz in sizes_list if sz == 3)
-        else:
-            num_singleton = np.nan
-            num_size2 = np.nan
-            num_size3 = np.nan
-
-        rows.append({
-            "file": file_path.name,
-            "row_number": line_num,
-            "func": row.func,
-            "blocks_hdr": row.blocks,
-            "kernels_hdr": row.kernels,
-            "blocks_parsed": total_nodes,
-            "scc_count_parsed": num_scc,
-            "nontriv_scc_count": num_nontriv,
-            "largest_scc": largest,
-            "nontriv_nodes": nontriv_nodes,
-            "frac_nodes_in_nontriv_scc": frac_nontriv,
-            "is_all_singletons": is_all_singletons,
-            "is_loopy": is_loopy,
-            "is_one_nontriv": is_one_nontriv,
-            "one_nontriv_size": one_size,
-            "num_singleton_scc": num_singleton,
-            "num_size2_scc": num_size2,
-            "num_size3_scc": num_size3,
-            "merge_mass_parsed": merge_mass,
-            "merge_mass_header": row.blocks - row.kernels,
-            "hhi_sizes": hhi,
-        })
-
-        n_rows += 1
-        ctr_nontrivial_count[num_nontriv] += 1
-        if is_one_nontriv:
-            ctr_one_nontrivial_size[int(one_size)] += 1
-
-    df = pd.DataFrame(rows)
-    if df.empty:
+    frames = [f for f in map_files(_analyze_file, files, limit=args.max_rows) if not f.empty]
+    if not frames:
         raise SystemExit("No valid rows parsed.")
+    df = pd.concat(frames, ignore_index=True)
+    if args.max_rows:
+        df = df.head(args.max_rows)
 
     print(f"Files scanned: {len(files)}")
     print(f"Rows parsed  : {len(df)}")
@@ -175,31 +236,35 @@ def main():
     one_df = df[df["is_one_nontriv"]].copy()
     if not one_df.empty:
         s = one_df["one_nontriv_size"].astype(int)
+        median, p90, p99 = np.percentile(s, [50, 90, 99])
         print("Single non-trivial SCC size (conditional on exactly one):")
         print({
             "n": int(len(s)),
             "min": int(s.min()),
-            "median": float(np.percentile(s, 50)),
-            "p90": float(np.percentile(s, 90)),
-            "p99": float(np.percentile(s, 99)),
+            "median": float(median),
+            "p90": float(p90),
+            "p99": float(p99),
             "max": int(s.max()),
             "mean": float(s.mean()),
         })
         print()
 
     print("Non-trivial SCC count per CFG (top buckets):")
-    for k in sorted(ctr_nontrivial_count.keys())[:10]:
-        print(f"  {k}: {ctr_nontrivial_count[k]}")
-    if len(ctr_nontrivial_count) > 10:
+    nontriv_hist = np.bincount(df["nontriv_scc_count"].to_numpy())
+    buckets = np.flatnonzero(nontriv_hist)
+    for k in buckets[:10]:
+        print(f"  {k}: {nontriv_hist[k]}")
+    if buckets.size > 10:
         print("  ...")
     print()
 
     frac = df["frac_nodes_in_nontriv_scc"].to_numpy()
+    median, p90, p99 = np.nanpercentile(frac, [50, 90, 99])
     print("Fraction of nodes in non-trivial SCCs (overall):")
     print({
-        "median": float(np.nanpercentile(frac, 50)),
-        "p90": float(np.nanpercentile(frac, 90)),
-        "p99": float(np.nanpercentile(frac, 99)),
+        "median": float(median),
+        "p90": float(p90),
+        "p99": float(p99),
         "max": float(np.nanmax(frac)),
     })
     print()